@@ -3,70 +3,186 @@
 # ============================
 
 # ---- 1. Imports ----
+import argparse
+import contextlib
+import glob
+import hashlib
+import os
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+from pandas.api.types import union_categoricals
+from pandas.tseries.api import guess_datetime_format
 
-# For better plots
-plt.style.use("seaborn-v0_8")
-sns.set_palette("Set2")
+# Charts are opt-in: a plain run only prints the KPI and cohort tables
+parser = argparse.ArgumentParser(description="Cohort & sales analysis of business sales data.")
+parser.add_argument("--plots", action="store_true", help="render the charts as well as the printed tables")
+args = parser.parse_args()
 
-# ---- 2. Load data ----
-file_path = r"C:\Users\Rishit\OneDrive\Desktop\sales.csv"
+if args.plots:
+    import matplotlib.pyplot as plt
+    import seaborn as sns
 
-df = pd.read_csv(file_path)
+    # For better plots
+    plt.style.use("seaborn-v0_8")
+    sns.set_palette("Set2")
 
-print("Raw shape:", df.shape)
-print("Columns:", df.columns.tolist())
+# ---- 2. Load data ----
+file_path = r"C:\Users\Rishit\OneDrive\Desktop\sales.csv"
 
-# ---- 3. Basic cleaning & type conversion ----
+# Bump when parse_date or load_and_clean change which rows or values get cached
+cache_version = 4
 
 # Standardize column names (strip spaces, lower-case)
-df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
+def standardize_column(name):
+    return name.strip().lower().replace(" ", "_")
+
+# Needed columns and load dtypes; "total" stays float64 so revenue sums keep cents
+load_dtypes = {
+    "order_id": "category",
+    "order_date": "string",
+    "status": "category",
+    "qty_ordered": "float32",
+    "price": "float32",
+    "value": "float32",
+    "discount_amount": "float32",
+    "total": "float64",
+    "category": "category",
+    "payment_method": "category",
+    "cust_id": "category",
+    "age": "float32",
+    "region": "category",
+    "discount_percent": "float32",
+}
+
+# Convert order_date to datetime
+# Try multiple formats, given examples like 01/10/2020 and 13/11/2020
+# Returns the parsed column and the fallback format used, so chunks can reuse it
+def parse_date(col, date_format="%d/%m/%Y", fallback_format=None):
+    # Fast path: explicit format lets pandas skip per-element parsing
+    parsed = pd.to_datetime(col, format=date_format, errors="coerce")
+
+    # Fall back only for rows the fast path missed; the format is guessed once
+    # from the first missed value ("mixed" parses per value if it can't be guessed)
+    missing = parsed.isna() & col.notna()
+    if missing.any():
+        missed = col[missing]
+        # Year-first values (e.g. ISO 2020-10-01) are never day-first
+        dayfirst = not missed.iloc[0][:4].isdigit()
+        if fallback_format is None:
+            fallback_format = guess_datetime_format(missed.iloc[0], dayfirst=dayfirst) or "mixed"
+        parsed[missing] = pd.to_datetime(missed, format=fallback_format, dayfirst=dayfirst, errors="coerce")
+    return parsed, fallback_format
+
+def load_and_clean(path, chunksize=100_000):
+    # Map the raw header onto the standardized names so only needed columns are read
+    raw_columns = pd.read_csv(path, nrows=0).columns
+    usecols = [c for c in raw_columns if standardize_column(c) in load_dtypes]
+    dtypes = {c: load_dtypes[standardize_column(c)] for c in usecols}
+    standardized = [standardize_column(c) for c in usecols]
+
+    # ---- 3. Basic cleaning & type conversion ----
+
+    # Read and clean in chunks so only one raw chunk is in memory at a time
+    categorical_cols = [
+        c for c in ["cust_id", "order_id", "category", "payment_method", "status", "region"]
+        if c in standardized
+    ]
+    frames = []
+    raw_rows = 0
+    fallback_format = None
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        raw_rows += len(chunk)
+        chunk.columns = standardized
+
+        chunk["order_date"], fallback_format = parse_date(chunk["order_date"], fallback_format=fallback_format)
+
+        # Drop rows with an invalid date or no customer/order id
+        valid_rows = chunk["order_date"].notna() & chunk["order_id"].notna() & chunk["cust_id"].notna()
+        kept = chunk[valid_rows]
+
+        # Prune categories seen only in dropped rows, or every raw id stays in memory
+        pruned = {c: kept[c].cat.remove_unused_categories() for c in categorical_cols}
+        frames.append(kept.assign(**pruned))
+        del chunk, kept, pruned
+
+    # Give chunk categoricals one shared dtype so concat keeps them categorical
+    if len(frames) > 1:
+        shared_dtypes = {}
+        for col in categorical_cols:
+            union = union_categoricals([frame[col] for frame in frames], sort_categories=True)
+            shared_dtypes[col] = pd.CategoricalDtype(union.categories)
+        frames = [frame.astype(shared_dtypes) for frame in frames]
+
+    # concat leaves each column in its own contiguous buffer for the reductions below
+    df = pd.concat(frames, ignore_index=True)
+    del frames
+
+    # Raw header and row count travel with the frame (and its cache) for the report
+    df.attrs["raw_columns"] = raw_columns.tolist()
+    df.attrs["raw_rows"] = raw_rows
+    return df
+
+# Parquet cache of the cleaned data, tagged with the loader schema, reused while newer than the CSV
+schema_tag = hashlib.sha1(repr((cache_version, sorted(load_dtypes.items()))).encode()).hexdigest()[:8]
+parquet_path = f"{file_path}.clean-{schema_tag}.parquet"
+
+df = None
+if os.path.exists(parquet_path) and os.path.getmtime(parquet_path) > os.path.getmtime(file_path):
+    try:
+        df = pd.read_parquet(parquet_path)
+        print("Loaded cleaned data from cache:", parquet_path)
+    except (ImportError, OSError, ValueError) as exc:
+        # An unreadable cache is just a miss; it is rebuilt and rewritten below
+        print("Ignoring unreadable cache:", exc)
+
+if df is None:
+    df = load_and_clean(file_path)
+
+    # Write to a temp file and rename, so an interrupted write never leaves a truncated cache
+    tmp_path = parquet_path + ".tmp"
+    try:
+        df.to_parquet(tmp_path, compression="zstd")
+        os.replace(tmp_path, parquet_path)
+
+        # Drop caches (and leftover .tmp files) written under other schema tags
+        for stale_path in glob.glob(glob.escape(file_path) + ".clean-*.parquet*"):
+            if stale_path != parquet_path:
+                with contextlib.suppress(OSError):
+                    os.remove(stale_path)
+    except ImportError:
+        # Parquet support (pyarrow) is optional; without it the cache is skipped
+        pass
+    except OSError as exc:
+        print("Could not write cache, continuing without it:", exc)
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+
+raw_columns = df.attrs.pop("raw_columns")
+raw_rows = df.attrs.pop("raw_rows")
+print("Columns:", raw_columns)
 
 # Expected important columns:
 # order_id, order_date, status, item_id, sku, qty_ordered, price, value,
 # discount_amount, total, category, payment_method, cust_id, year, month, ...
 # Adjust if your actual names differ after cleaning
-print("Standardized columns:", df.columns.tolist())
-
-# Convert order_date to datetime
-# Try multiple formats, given examples like 01/10/2020 and 13/11/2020
-def parse_date(col):
-    return pd.to_datetime(col, errors="coerce", dayfirst=True)
-
-df["order_date"] = parse_date(df["order_date"])
-
-# Remove rows with invalid dates
-df = df[~df["order_date"].isna()].copy()
-
-# Numeric conversions
-numeric_cols = ["qty_ordered", "price", "value", "discount_amount", "total", "age", "discount_percent"]
-for col in numeric_cols:
-    if col in df.columns:
-        df[col] = pd.to_numeric(df[col], errors="coerce")
-
-# Basic sanity cleaning: drop rows with no customer or order id
-df = df.dropna(subset=["order_id", "cust_id"])
-
-# Ensure order_id and cust_id are strings
-df["order_id"] = df["order_id"].astype(str)
-df["cust_id"] = df["cust_id"].astype(str)
-
+print("Standardized columns:", [standardize_column(c) for c in raw_columns])
+print("Raw shape:", (raw_rows, len(raw_columns)))
 print("Cleaned shape:", df.shape)
 
 # ---- 4. Create time features ----
 
 df["order_year"] = df["order_date"].dt.year
-df["order_month"] = df["order_date"].dt.to_period("M")  # e.g., 2020-10
-df["order_month_start"] = df["order_month"].dt.to_timestamp()
+# Truncate to month start directly on the datetime64 buffer (e.g., 2020-10-01)
+df["order_month_start"] = df["order_date"].values.astype("datetime64[M]").astype("datetime64[ns]")
 
 # ---- 5. Basic business KPIs ----
 
+# One row per order (first line item), shared by the order counts below
+orders = df[["order_id", "order_month_start"]].drop_duplicates("order_id", keep="first")
+
 # Overall metrics
 total_revenue = df["total"].sum()
-total_orders = df["order_id"].nunique()
+total_orders = len(orders)
 total_customers = df["cust_id"].nunique()
 
 print("\n=== BASIC KPIs ===")
@@ -74,61 +190,67 @@ print(f"Total revenue: {total_revenue:,.2f}")
 print(f"Total orders: {total_orders}")
 print(f"Total customers: {total_customers}")
 
-# Revenue by month
-revenue_by_month = df.groupby("order_month_start")["total"].sum().reset_index()
+# Revenue by month (kept as a month-indexed Series; plots and AOV use it as-is)
+revenue_by_month = df.groupby("order_month_start", sort=True, observed=True)["total"].sum()
 
-# Orders by month
-orders_by_month = df.groupby("order_month_start")["order_id"].nunique().reset_index(name="orders")
+# Orders by month, counted from the deduplicated frame instead of per-month nunique
+orders_by_month = orders.groupby("order_month_start", sort=True, observed=True).size()
 
 # Revenue by category
 if "category" in df.columns:
-    revenue_by_category = df.groupby("category")["total"].sum().sort_values(ascending=False)
+    revenue_by_category = df.groupby("category", observed=True)["total"].sum().sort_values(ascending=False)
     print("\nRevenue by category:")
     print(revenue_by_category)
 
 # Revenue by payment method
 if "payment_method" in df.columns:
-    revenue_by_payment = df.groupby("payment_method")["total"].sum().sort_values(ascending=False)
+    revenue_by_payment = df.groupby("payment_method", observed=True)["total"].sum().sort_values(ascending=False)
     print("\nRevenue by payment method:")
     print(revenue_by_payment)
 
 # ---- 6. Cohort analysis setup ----
 
 # 6.1 Find each customer's first order month (cohort_month)
-customer_first_order = (
-    df.groupby("cust_id")["order_month_start"]
-    .min()
-    .reset_index()
-    .rename(columns={"order_month_start": "cohort_month"})
-)
-
-df = df.merge(customer_first_order, on="cust_id", how="left")
+# transform broadcasts the per-customer min back onto every row, no merge needed
+df["cohort_month"] = df.groupby("cust_id", observed=True)["order_month_start"].transform("min")
 
 # 6.2 Define cohort index (number of months since cohort_month)
-def get_cohort_index(order_month, cohort_month):
-    return (order_month.year - cohort_month.year) * 12 + (order_month.month - cohort_month.month) + 1
-
-df["cohort_index"] = df.apply(
-    lambda x: get_cohort_index(x["order_month_start"], x["cohort_month"]), axis=1
-)
+# Vectorized: months since epoch for both columns, then a single subtraction
+order_months = df["order_month_start"].values.astype("datetime64[M]").view("int64")
+cohort_months = df["cohort_month"].values.astype("datetime64[M]").view("int64")
+df["cohort_index"] = (order_months - cohort_months + 1).astype("int32")
 
 # ---- 7. Cohort: customer retention (count of unique customers) ----
 
+# Group on one packed int64 (month << 16 | index) key, then unpack to a MultiIndex
+cohort_key = (cohort_months << 16) | df["cohort_index"].to_numpy("int64")
+# cust_id is categorical, so nunique already counts int codes (no Numba kernel needed)
 cohort_data = (
-    df.groupby(["cohort_month", "cohort_index"])["cust_id"]
-    .nunique()
-    .reset_index()
-    .rename(columns={"cust_id": "num_customers"})
+    df.groupby(cohort_key, sort=True)
+    .agg(num_customers=("cust_id", "nunique"), total=("total", "sum"))
 )
-
-cohort_pivot = cohort_data.pivot_table(
-    index="cohort_month",
-    columns="cohort_index",
-    values="num_customers"
+packed = cohort_data.index.to_numpy()
+cohort_data.index = pd.MultiIndex.from_arrays(
+    [
+        (packed >> 16).astype("datetime64[M]").astype("datetime64[ns]"),
+        (packed & 0xFFFF).astype("int32"),
+    ],
+    names=["cohort_month", "cohort_index"],
 )
 
+cohort_pivot = cohort_data["num_customers"].unstack("cohort_index")
+
 cohort_size = cohort_pivot.iloc[:, 0]  # number of customers in month 1 by cohort
-cohort_retention = cohort_pivot.divide(cohort_size, axis=0)
+
+# Retention as one float32 NumPy division by each cohort's size (empty cohorts stay 0)
+cohort_counts = cohort_pivot.to_numpy(dtype="float32")
+cohort_sizes = cohort_counts[:, 0:1]
+retention_values = np.divide(
+    cohort_counts, cohort_sizes, out=np.zeros_like(cohort_counts), where=cohort_sizes != 0
+)
+cohort_retention = pd.DataFrame(
+    retention_values, index=cohort_pivot.index, columns=cohort_pivot.columns
+)
 
 print("\n=== COHORT SIZE (first month customers per cohort) ===")
 print(cohort_size)
@@ -138,137 +260,119 @@ print(cohort_retention.round(3))
 
 # ---- 8. Cohort: revenue per cohort per period ----
 
-cohort_revenue = (
-    df.groupby(["cohort_month", "cohort_index"])["total"]
-    .sum()
-    .reset_index()
-)
-
-cohort_revenue_pivot = cohort_revenue.pivot_table(
-    index="cohort_month",
-    columns="cohort_index",
-    values="total"
-)
+cohort_revenue_pivot = cohort_data["total"].unstack("cohort_index")
 
 print("\n=== COHORT REVENUE TABLE ===")
 print(cohort_revenue_pivot.round(2))
 
 # ---- 9. Visualizations ----
 
-# 9.1 Revenue over time
-plt.figure(figsize=(10, 5))
-sns.lineplot(data=revenue_by_month, x="order_month_start", y="total", marker="o")
-plt.title("Monthly Revenue Over Time")
-plt.xlabel("Month")
-plt.ylabel("Revenue")
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.show()
-
-# 9.2 Orders over time
-plt.figure(figsize=(10, 5))
-sns.lineplot(data=orders_by_month, x="order_month_start", y="orders", marker="o")
-plt.title("Monthly Orders Over Time")
-plt.xlabel("Month")
-plt.ylabel("Number of Orders")
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.show()
-
-# 9.3 Revenue by category (top 10)
-if "category" in df.columns:
-    top_cat = (
-        df.groupby("category")["total"]
-        .sum()
-        .sort_values(ascending=False)
-        .head(10)
-        .reset_index()
-    )
+if args.plots:
+    # 9.1 Revenue over time
     plt.figure(figsize=(10, 5))
-    sns.barplot(data=top_cat, x="category", y="total")
-    plt.title("Revenue by Category (Top 10)")
-    plt.xlabel("Category")
+    sns.lineplot(x=revenue_by_month.index, y=revenue_by_month.values, marker="o")
+    plt.title("Monthly Revenue Over Time")
+    plt.xlabel("Month")
     plt.ylabel("Revenue")
-    plt.xticks(rotation=45, ha="right")
+    plt.xticks(rotation=45)
     plt.tight_layout()
     plt.show()
 
-# 9.4 Revenue by payment method
-if "payment_method" in df.columns:
-    pay_plot = (
-        df.groupby("payment_method")["total"]
-        .sum()
-        .sort_values(ascending=False)
-        .reset_index()
-    )
-    plt.figure(figsize=(8, 4))
-    sns.barplot(data=pay_plot, x="payment_method", y="total")
-    plt.title("Revenue by Payment Method")
-    plt.xlabel("Payment Method")
-    plt.ylabel("Revenue")
+    # 9.2 Orders over time
+    plt.figure(figsize=(10, 5))
+    sns.lineplot(x=orders_by_month.index, y=orders_by_month.values, marker="o")
+    plt.title("Monthly Orders Over Time")
+    plt.xlabel("Month")
+    plt.ylabel("Number of Orders")
     plt.xticks(rotation=45)
     plt.tight_layout()
     plt.show()
 
-# 9.5 Cohort retention heatmap
-plt.figure(figsize=(12, 6))
-sns.heatmap(
-    cohort_retention,
-    annot=True,
-    fmt=".0%",
-    cmap="Blues"
-)
-plt.title("Customer Retention by Cohort (Percentage)")
-plt.xlabel("Cohort Index (Months since first purchase)")
-plt.ylabel("Cohort Month")
-plt.tight_layout()
-plt.show()
-
-# 9.6 Cohort revenue heatmap
-plt.figure(figsize=(12, 6))
-sns.heatmap(
-    cohort_revenue_pivot,
-    annot=True,
-    fmt=".0f",
-    cmap="Greens"
-)
-plt.title("Revenue by Cohort and Cohort Index")
-plt.xlabel("Cohort Index (Months since first purchase)")
-plt.ylabel("Cohort Month")
-plt.tight_layout()
-plt.show()
+    # 9.3 Revenue by category (top 10)
+    if "category" in df.columns:
+        top_cat = revenue_by_category.head(10)
+        plt.figure(figsize=(10, 5))
+        sns.barplot(x=top_cat.index, y=top_cat.values, order=top_cat.index)
+        plt.title("Revenue by Category (Top 10)")
+        plt.xlabel("Category")
+        plt.ylabel("Revenue")
+        plt.xticks(rotation=45, ha="right")
+        plt.tight_layout()
+        plt.show()
+
+    # 9.4 Revenue by payment method
+    if "payment_method" in df.columns:
+        plt.figure(figsize=(8, 4))
+        sns.barplot(x=revenue_by_payment.index, y=revenue_by_payment.values, order=revenue_by_payment.index)
+        plt.title("Revenue by Payment Method")
+        plt.xlabel("Payment Method")
+        plt.ylabel("Revenue")
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        plt.show()
+
+    # 9.5 Cohort retention heatmap
+    plt.figure(figsize=(12, 6))
+    sns.heatmap(
+        cohort_retention,
+        annot=True,
+        fmt=".0%",
+        cmap="Blues"
+    )
+    plt.title("Customer Retention by Cohort (Percentage)")
+    plt.xlabel("Cohort Index (Months since first purchase)")
+    plt.ylabel("Cohort Month")
+    plt.tight_layout()
+    plt.show()
+
+    # 9.6 Cohort revenue heatmap
+    plt.figure(figsize=(12, 6))
+    sns.heatmap(
+        cohort_revenue_pivot,
+        annot=True,
+        fmt=".0f",
+        cmap="Greens"
+    )
+    plt.title("Revenue by Cohort and Cohort Index")
+    plt.xlabel("Cohort Index (Months since first purchase)")
+    plt.ylabel("Cohort Month")
+    plt.tight_layout()
+    plt.show()
 
 # ---- 10. Additional useful insights ----
 
+# Per-customer revenue and order counts in a single groupby pass
+customer_stats = (
+    df.groupby("cust_id", observed=True)
+    .agg(customer_revenue=("total", "sum"), num_orders=("order_id", "nunique"))
+)
+
 # 10.1 CLV-like metric: total revenue per customer
-customer_revenue = df.groupby("cust_id")["total"].sum().reset_index(name="customer_revenue")
+customer_revenue = customer_stats[["customer_revenue"]]
 print("\n=== TOP 10 CUSTOMERS BY REVENUE ===")
-print(customer_revenue.sort_values("customer_revenue", ascending=False).head(10))
+print(customer_revenue.nlargest(10, "customer_revenue"))
 
 # 10.2 Number of orders per customer
-customer_orders = df.groupby("cust_id")["order_id"].nunique().reset_index(name="num_orders")
+customer_orders = customer_stats[["num_orders"]]
 print("\n=== TOP 10 CUSTOMERS BY NUMBER OF ORDERS ===")
-print(customer_orders.sort_values("num_orders", ascending=False).head(10))
+print(customer_orders.nlargest(10, "num_orders"))
 
 # 10.3 AOV (Average Order Value) overall and by month
-aov_overall = df.groupby("order_id")["total"].sum().mean()
+# Mean of per-order totals is total revenue over order count; reuse the KPIs
+aov_overall = total_revenue / total_orders
 print(f"\nAverage Order Value (Overall): {aov_overall:,.2f}")
 
-aov_by_month = (
-    df.groupby("order_month_start")["total"]
-    .sum()
-    .div(df.groupby("order_month_start")["order_id"].nunique())
-    .reset_index(name="AOV")
-)
+if args.plots:
+    aov_by_month = revenue_by_month.div(orders_by_month)
 
-plt.figure(figsize=(10, 5))
-sns.lineplot(data=aov_by_month, x="order_month_start", y="AOV", marker="o")
-plt.title("Average Order Value by Month")
-plt.xlabel("Month")
-plt.ylabel("AOV")
-plt.xticks(rotation=45)
-plt.tight_layout()
-plt.show()
+    plt.figure(figsize=(10, 5))
+    sns.lineplot(x=aov_by_month.index, y=aov_by_month.values, marker="o")
+    plt.title("Average Order Value by Month")
+    plt.xlabel("Month")
+    plt.ylabel("AOV")
+    plt.xticks(rotation=45)
+    plt.tight_layout()
+    plt.show()
 
 # 10.4 Status distribution (completed, canceled, etc.)
 if "status" in df.columns:
@@ -276,27 +380,29 @@ if "status" in df.columns:
     print("\n=== ORDER STATUS COUNTS ===")
     print(status_counts)
 
-    plt.figure(figsize=(6, 4))
-    sns.barplot(x=status_counts.index, y=status_counts.values)
-    plt.title("Order Status Distribution")
-    plt.xlabel("Status")
-    plt.ylabel("Number of Orders")
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-    plt.show()
+    if args.plots:
+        plt.figure(figsize=(6, 4))
+        sns.barplot(x=status_counts.index, y=status_counts.values, order=status_counts.index)
+        plt.title("Order Status Distribution")
+        plt.xlabel("Status")
+        plt.ylabel("Number of Orders")
+        plt.xticks(rotation=45)
+        plt.tight_layout()
+        plt.show()
 
 # 10.5 Region-wise revenue (if region column exists)
 if "region" in df.columns:
-    region_rev = df.groupby("region")["total"].sum().sort_values(ascending=False)
+    region_rev = df.groupby("region", observed=True)["total"].sum().sort_values(ascending=False)
     print("\n=== REVENUE BY REGION ===")
     print(region_rev)
 
-    plt.figure(figsize=(8, 4))
-    sns.barplot(x=region_rev.index, y=region_rev.values)
-    plt.title("Revenue by Region")
-    plt.xlabel("Region")
-    plt.ylabel("Revenue")
-    plt.tight_layout()
-    plt.show()
+    if args.plots:
+        plt.figure(figsize=(8, 4))
+        sns.barplot(x=region_rev.index, y=region_rev.values, order=region_rev.index)
+        plt.title("Revenue by Region")
+        plt.xlabel("Region")
+        plt.ylabel("Revenue")
+        plt.tight_layout()
+        plt.show()
 
 print("\nScript finished successfully.")